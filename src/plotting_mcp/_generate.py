@@ -0,0 +1,296 @@
+"""Shared implementation of the generate_plot and generate_plots MCP tools."""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import structlog
+from mcp.types import ImageContent, ResourceLink, TextContent
+from pydantic import AnyUrl
+
+from plotting_mcp.configure_logging import configure_logging
+from plotting_mcp.constants import (
+    MAX_CSV_ROWS,
+    PLOT_BASE_URL,
+    PLOT_CACHE_SIZE,
+    PLOT_FORMAT,
+    PLOT_URL_MAX_BYTES,
+    PLOT_URL_TTL,
+    PLOT_WORKERS,
+)
+from plotting_mcp.plot import plot_to_buffer, warmup
+from plotting_mcp.utils import b64encode_str, digest_str, loads_json, read_csv, sizeof_fmt
+
+logger = structlog.get_logger(__name__)
+# structlog builds the full event before the stdlib handler filters it by level, so the
+# level is checked on the underlying stdlib logger to skip that work when it is disabled
+_stdlib_logger = logging.getLogger(__name__)
+
+PlotResult = tuple[TextContent, ImageContent | ResourceLink]
+
+# The success message never changes, so one instance is shared by every response
+_SUCCESS_TEXT = TextContent(type="text", text="Plot generated successfully")
+
+# LRU cache of generated plots, keyed by a digest of the CSV data plus the plot arguments.
+# The digest keeps large CSV payloads from being held in memory as keys.
+_plot_cache: OrderedDict[tuple[bytes, str, str], PlotResult] = OrderedDict()
+
+# Plots downloadable from /plot/<id> when PLOT_BASE_URL is set, with their expiry time.
+# Every plot lives for the same PLOT_URL_TTL, so keeping them in the order they were last
+# served also keeps them ordered by expiry, oldest first.
+_served_plots: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+# Total size of the plots in _served_plots
+_served_bytes = 0
+
+
+def _cache_get(key: tuple[bytes, str, str]) -> PlotResult | None:
+    """Return a cached plot and mark it as most recently used."""
+    result = _plot_cache.get(key)
+    if result is not None:
+        _plot_cache.move_to_end(key)
+    return result
+
+
+def _cache_put(key: tuple[bytes, str, str], result: PlotResult) -> None:
+    """Cache a plot, evicting the least recently used one if the cache is full."""
+    if PLOT_CACHE_SIZE <= 0:
+        return
+    _plot_cache[key] = result
+    _plot_cache.move_to_end(key)
+    while len(_plot_cache) > PLOT_CACHE_SIZE:
+        _plot_cache.popitem(last=False)
+
+
+def _drop_served_plot(plot_id: str) -> None:
+    """Stop serving a plot."""
+    global _served_bytes
+    plot_bytes, _ = _served_plots.pop(plot_id)
+    _served_bytes -= len(plot_bytes)
+
+
+def _evict_served_plots(now: float) -> None:
+    """
+    Drop expired plots, then the oldest ones while over PLOT_URL_MAX_BYTES.
+
+    The most recently served plot is always kept, so a fresh link never points nowhere.
+    """
+    while _served_plots:
+        plot_id, (_, expiry) = next(iter(_served_plots.items()))
+        over_budget = _served_bytes > PLOT_URL_MAX_BYTES and len(_served_plots) > 1
+        if expiry > now and not over_budget:
+            break
+        _drop_served_plot(plot_id)
+
+
+def _serve_plot(plot_id: str, plot_bytes: bytes) -> None:
+    """Make a plot downloadable for PLOT_URL_TTL seconds, dropping expired or excess ones."""
+    global _served_bytes
+    if plot_id in _served_plots:
+        _drop_served_plot(plot_id)
+    now = time.monotonic()
+    _served_plots[plot_id] = (plot_bytes, now + PLOT_URL_TTL)
+    _served_bytes += len(plot_bytes)
+    _evict_served_plots(now)
+
+
+def _refresh_served_plot(plot_id: str) -> bool:
+    """Extend the lifetime of a served plot. Returns False if it has already expired."""
+    now = time.monotonic()
+    _evict_served_plots(now)
+    entry = _served_plots.get(plot_id)
+    if entry is None:
+        return False
+    _served_plots[plot_id] = (entry[0], now + PLOT_URL_TTL)
+    _served_plots.move_to_end(plot_id)
+    return True
+
+
+def get_served_plot(plot_id: str) -> bytes | None:
+    """Return the bytes of a served plot, or None if it is unknown or expired."""
+    # Expired plots are dropped on every lookup too, so their memory is not held until the
+    # next plot is served
+    _evict_served_plots(time.monotonic())
+    entry = _served_plots.get(plot_id)
+    return None if entry is None else entry[0]
+
+
+# Rendering is CPU-bound and holds the GIL, so plots are rendered in worker processes to let
+# concurrent requests run in parallel. Started by start_renderer, or on the first request.
+_pool: ProcessPoolExecutor | None = None
+
+
+def _init_worker(log_level: str) -> None:
+    """Set up logging and prime matplotlib in a freshly started worker process."""
+    # Without this, structlog would print to stdout, which is the MCP channel for stdio
+    configure_logging(log_level=log_level)
+    warmup()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Return the worker pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=PLOT_WORKERS,
+            # Forking a process that already runs threads (event loop, pyarrow) is unsafe
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(logging.getLevelName(logging.getLogger().getEffectiveLevel()),),
+        )
+    return _pool
+
+
+def start_renderer() -> None:
+    """
+    Warm up rendering up front, so the first requests do not pay for it.
+
+    Starts every worker process, each of which warms up as it starts, and blocks until they
+    are up, which raises here if they fail to start. When the pool is disabled, warms up
+    this process instead.
+    """
+    if PLOT_WORKERS <= 0:
+        warmup()
+        return
+    pool = _get_pool()
+    # Workers are only spawned as tasks arrive, so submit one per worker to start them all
+    for future in [pool.submit(os.getpid) for _ in range(PLOT_WORKERS)]:
+        future.result()
+
+
+def _render(
+    csv_data: str, plot_type: str, max_rows: int | None, kwargs: dict, encode: bool
+) -> tuple[int, str | bytes]:
+    """
+    Parse the CSV data and render the plot. Runs inside a worker process.
+
+    Returns the image size together with its base64 encoding, or its raw bytes when `encode`
+    is False.
+    """
+    # The CSV string is sent to the worker instead of the DataFrame, which is cheaper to
+    # pickle and lets the parse run in parallel as well
+    df = read_csv(csv_data, max_rows=max_rows)
+    with plot_to_buffer(df, plot_type, kwargs) as image:
+        # Encoding straight from the render buffer saves copying the image out of it first
+        return image.nbytes, b64encode_str(image) if encode else image.tobytes()
+
+
+async def _render_async(
+    csv_data: str, plot_type: str, max_rows: int | None, kwargs: dict, encode: bool
+) -> tuple[int, str | bytes]:
+    """Render a plot in the worker pool, or inline when the pool is disabled."""
+    global _pool
+    if PLOT_WORKERS <= 0:
+        return _render(csv_data, plot_type, max_rows, kwargs, encode)
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            _get_pool(), _render, csv_data, plot_type, max_rows, kwargs, encode
+        )
+    except BrokenProcessPool:
+        # A worker died abruptly, drop the pool so the next request starts a fresh one
+        _pool = None
+        raise
+
+
+async def generate_plot_impl(
+    csv_data: str, plot_type: str = "line", json_kwargs: str = "None"
+) -> PlotResult:
+    """
+    Parse the CSV data and kwargs, render the plot and wrap it as MCP content.
+
+    The plot is returned inline as a base64 image, or as a link to /plot/<id> when
+    PLOT_BASE_URL is set.
+    """
+    cache_key = (digest_str(csv_data), plot_type, json_kwargs)
+    # Identical requests share a plot id, so a cached link stays valid while it is served
+    plot_id = digest_str(f"{cache_key[0].hex()}|{plot_type}|{json_kwargs}").hex()
+    cached = _cache_get(cache_key)
+    if cached is not None and (PLOT_BASE_URL is None or _refresh_served_plot(plot_id)):
+        logger.debug("Plot served from cache", plot_type=plot_type)
+        return cached
+
+    if json_kwargs and json_kwargs != "None":
+        try:
+            kwargs = loads_json(json_kwargs)
+        except Exception:
+            logger.exception("Invalid JSON for kwargs")
+            raise
+        if not isinstance(kwargs, dict):
+            raise ValueError(
+                f"json_kwargs must be a JSON object, got {type(kwargs).__name__}: {json_kwargs}"
+            )
+    else:
+        kwargs = {}
+
+    max_rows = kwargs.pop("max_rows", MAX_CSV_ROWS)
+    # Checked here so a bad value fails with a clear message instead of inside the worker.
+    # Zero rows would always end in "CSV data is empty", so it is rejected as well.
+    if isinstance(max_rows, bool) or not isinstance(max_rows, int) or max_rows < 1:
+        raise ValueError(f"max_rows must be a positive integer, got {max_rows!r}")
+
+    try:
+        # Serving the raw bytes over HTTP skips the base64 encode and its 33% size overhead
+        size, payload = await _render_async(
+            csv_data, plot_type, max_rows, kwargs, encode=PLOT_BASE_URL is None
+        )
+
+        if _stdlib_logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "Plot generated successfully",
+                plot_type=plot_type,
+                kwargs=kwargs,
+                size=sizeof_fmt(size),
+            )
+        if PLOT_BASE_URL is not None and isinstance(payload, bytes):
+            _serve_plot(plot_id, payload)
+            image: ImageContent | ResourceLink = ResourceLink(
+                type="resource_link",
+                name=f"{plot_type}-plot",
+                uri=AnyUrl(f"{PLOT_BASE_URL.rstrip('/')}/plot/{plot_id}"),
+                mimeType=f"image/{PLOT_FORMAT}",
+                size=size,
+            )
+        else:
+            # The fields are built here and known to be valid, so skip pydantic's validation
+            # pass, which would otherwise re-check the whole base64 string
+            image = ImageContent.model_construct(
+                type="image",
+                data=payload,
+                mimeType=f"image/{PLOT_FORMAT}",
+            )
+        result = (_SUCCESS_TEXT, image)
+    except Exception:
+        logger.exception("Error generating plot")
+        raise
+
+    _cache_put(cache_key, result)
+    return result
+
+
+async def generate_plots_impl(
+    csv_data_list: list[str], plot_types: list[str], json_kwargs_list: list[str]
+) -> list[PlotResult]:
+    """Generate several plots concurrently, one for each position in the three lists."""
+    if not len(csv_data_list) == len(plot_types) == len(json_kwargs_list):
+        raise ValueError(
+            "csv_data_list, plot_types and json_kwargs_list must have the same length, got "
+            f"{len(csv_data_list)}, {len(plot_types)} and {len(json_kwargs_list)}"
+        )
+
+    # Dispatch every plot at once so they render in parallel across the worker pool
+    return list(
+        await asyncio.gather(
+            *(
+                generate_plot_impl(csv_data, plot_type, json_kwargs)
+                for csv_data, plot_type, json_kwargs in zip(
+                    csv_data_list, plot_types, json_kwargs_list, strict=True
+                )
+            )
+        )
+    )
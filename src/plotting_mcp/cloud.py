@@ -1,16 +1,18 @@
 """Cloud-specific entrypoint for FastMCP Cloud deployment using streamable HTTP."""
 
-import base64
-import io
-import json
-
-import pandas as pd
 import structlog
 from mcp.server.fastmcp import FastMCP
-from mcp.types import ImageContent, TextContent
-
-from plotting_mcp.plot import plot_to_bytes
-from plotting_mcp.utils import sizeof_fmt
+from mcp.types import ImageContent, ResourceLink, TextContent
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+from plotting_mcp._generate import (
+    generate_plot_impl,
+    generate_plots_impl,
+    get_served_plot,
+    start_renderer,
+)
+from plotting_mcp.constants import PLOT_FORMAT
 
 logger = structlog.get_logger(__name__)
 
@@ -20,9 +22,9 @@ def create_mcp_server() -> FastMCP:
     server = FastMCP("plotting-mcp")
 
     @server.tool()
-    def generate_plot(
+    async def generate_plot(
         csv_data: str, plot_type: str = "line", json_kwargs: str = "None"
-    ) -> tuple[TextContent, ImageContent]:
+    ) -> tuple[TextContent, ImageContent | ResourceLink]:
         """
         Generate a plot from CSV data.
 
@@ -34,6 +36,9 @@ def create_mcp_server() -> FastMCP:
                 If not specified, the plot will be generated with default parameters.
                 Additional plotting parameters in JSON format. For line/bar plots, Seaborn is used,
                 so any parameters supported by Seaborn's plotting functions can be passed.
+                For all plots, you can specify:
+                    - `max_rows` (int): maximum number of CSV rows to plot, extra rows are dropped
+                      (default: 500000)
                 For bar/line plots, you can specify:
                     - `x` (str): Column name for x-axis
                     - `y` (str): Column name for y-axis
@@ -47,40 +52,40 @@ def create_mcp_server() -> FastMCP:
                     - `marker` (str): marker style (default: 'o')
 
         Returns:
-            tuple[TextContent, ImageContent]: A tuple containing a success message and the
-            generated plot as an image.
+            tuple[TextContent, ImageContent | ResourceLink]: A tuple containing a success message
+            and the generated plot, either as an image or as a link to download it.
         """
-        if json_kwargs != "None":
-            try:
-                kwargs = json.loads(json_kwargs)
-            except Exception:
-                logger.exception("Invalid JSON for kwargs")
-                raise
-        else:
-            kwargs = {}
-
-        try:
-            df = pd.read_csv(io.StringIO(csv_data))
-
-            plot_bytes = plot_to_bytes(df, plot_type, **kwargs)
-
-            logger.info(
-                "Plot generated successfully",
-                plot_type=plot_type,
-                kwargs=kwargs,
-                size=sizeof_fmt(len(plot_bytes)),
-            )
-            return (
-                TextContent(type="text", text="Plot generated successfully"),
-                ImageContent(
-                    type="image",
-                    data=base64.b64encode(plot_bytes).decode(),
-                    mimeType="image/png",
-                ),
-            )
-        except Exception:
-            logger.exception("Error generating plot")
-            raise
+        return await generate_plot_impl(csv_data, plot_type, json_kwargs)
+
+    @server.tool()
+    async def generate_plots(
+        csv_data_list: list[str], plot_types: list[str], json_kwargs_list: list[str]
+    ) -> list[tuple[TextContent, ImageContent | ResourceLink]]:
+        """
+        Generate several plots from CSV data in a single call.
+
+        Args:
+            csv_data_list (list[str]): CSV data for each plot, as strings
+            plot_types (list[str]): Type of each plot (line, bar, pie, worldmap)
+            json_kwargs_list (list[str]): JSON string with additional parameters for each plot, or
+                "None" for default parameters. Accepts the same parameters as `generate_plot`.
+
+        The three lists must have the same length, the plot at each position is generated from the
+        entries at that position.
+
+        Returns:
+            list[tuple[TextContent, ImageContent | ResourceLink]]: One success message and generated
+            plot per requested plot, in the same order.
+        """
+        return await generate_plots_impl(csv_data_list, plot_types, json_kwargs_list)
+
+    @server.custom_route("/plot/{plot_id}", methods=["GET"])
+    async def get_plot(request: Request) -> Response:
+        """Download endpoint for plots returned as links (when PLOT_BASE_URL is set)."""
+        plot_bytes = get_served_plot(request.path_params["plot_id"])
+        if plot_bytes is None:
+            return JSONResponse({"error": "Plot not found or expired"}, status_code=404)
+        return Response(content=plot_bytes, media_type=f"image/{PLOT_FORMAT}")
 
     return server
 
@@ -88,5 +93,8 @@ def create_mcp_server() -> FastMCP:
 # Create the MCP server instance
 mcp = create_mcp_server()
 
+# Warm up rendering before the first request arrives
+start_renderer()
+
 # ASGI app for streamable HTTP transport (used by FastMCP Cloud)
 app = mcp.streamable_http_app()
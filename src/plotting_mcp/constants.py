@@ -6,7 +6,37 @@ import os
 PLOT_WIDTH = int(os.getenv("PLOT_WIDTH", 10))
 PLOT_HEIGHT = int(os.getenv("PLOT_HEIGHT", 6))
 PLOT_FIGURE_SIZE = (PLOT_WIDTH, PLOT_HEIGHT)
-PLOT_DPI = int(os.getenv("PLOT_DPI", 100))
+PLOT_DPI = int(os.getenv("PLOT_DPI", 96))
+# Image format of the generated plots: webp or png
+SUPPORTED_PLOT_FORMATS = ("webp", "png")
+PLOT_FORMAT = os.getenv("PLOT_FORMAT", "webp").lower()
+# Checked here so a bad value stops the server at startup instead of failing every request
+if PLOT_FORMAT not in SUPPORTED_PLOT_FORMATS:
+    raise ValueError(
+        f"Unsupported PLOT_FORMAT: {PLOT_FORMAT}. Supported formats: {list(SUPPORTED_PLOT_FORMATS)}"
+    )
+
+# Maximum number of CSV rows parsed per plot, larger inputs are truncated
+MAX_CSV_ROWS = int(os.getenv("MAX_CSV_ROWS", 500_000))
+
+# Number of generated plots kept in memory for repeated identical requests, 0 disables it
+PLOT_CACHE_SIZE = int(os.getenv("PLOT_CACHE_SIZE", 64))
+
+# Number of worker processes rendering plots, 0 renders in the server process instead.
+# Each worker loads its own copy of matplotlib, so the default is small: up to two workers,
+# bounded by the CPUs this process may run on, and none when it can only use one.
+_USABLE_CPUS = (
+    len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+)
+PLOT_WORKERS = int(os.getenv("PLOT_WORKERS", min(_USABLE_CPUS, 2) if _USABLE_CPUS > 1 else 0))
+
+# Public URL of the HTTP server. When set, plots are returned as links to /plot/<id>
+# instead of inline base64 images.
+PLOT_BASE_URL = os.getenv("PLOT_BASE_URL")
+# Seconds a linked plot stays available for download
+PLOT_URL_TTL = int(os.getenv("PLOT_URL_TTL", 300))
+# Maximum total size of the plots kept for download, the oldest are dropped first
+PLOT_URL_MAX_BYTES = int(os.getenv("PLOT_URL_MAX_BYTES", 32 * 1024 * 1024))
 
 # Constants for server configuration
 MCP_PORT = os.getenv("MCP_PORT", 9090)
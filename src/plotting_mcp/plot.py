@@ -1,14 +1,34 @@
 import io
+import threading
 from typing import Literal
 
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
+import matplotlib
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 from cartopy.mpl.geoaxes import GeoAxes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure, SubplotParams
 
-from plotting_mcp.constants import PLOT_DPI, PLOT_FIGURE_SIZE
+from plotting_mcp.constants import PLOT_DPI, PLOT_FIGURE_SIZE, PLOT_FORMAT
+
+# Pillow options for each supported output format. Lossless WebP keeps lines and text crisp
+# while still producing much smaller files than PNG. PNG uses the fastest zlib level, which
+# encodes several times faster than the default for slightly larger files.
+IMAGE_FORMAT_PIL_KWARGS = {
+    "png": {"compress_level": 1},
+    "webp": {"lossless": True},
+}
+
+# Column names recognized as coordinates in world map plots, compared case-insensitively
+LATITUDE_COLUMNS = frozenset({"lat", "latitude", "y"})
+LONGITUDE_COLUMNS = frozenset({"lon", "lng", "long", "longitude", "x"})
+
+# Figure and output buffer reused by plot_to_buffer across calls on the same thread, instead
+# of allocating new ones for every plot. Each pool worker process has its own.
+_thread_local = threading.local()
 
 
 def _auto_rotate_labels(ax: plt.Axes, axis: Literal["x", "y"] = "x") -> None:
@@ -45,6 +65,11 @@ def _auto_rotate_labels(ax: plt.Axes, axis: Literal["x", "y"] = "x") -> None:
         ax.tick_params(axis=axis, labelrotation=90)
 
 
+def _find_column(df: pd.DataFrame, names: frozenset[str]) -> str | None:
+    """Return the first column whose lowercased name is in `names`, if any."""
+    return next((col for col in df.columns if str(col).lower() in names), None)
+
+
 def _create_world_map_plot(ax: GeoAxes, df: pd.DataFrame, **kwargs) -> None:
     """Create a world map with coordinate points."""
     # Add map features
@@ -57,22 +82,8 @@ def _create_world_map_plot(ax: GeoAxes, df: pd.DataFrame, **kwargs) -> None:
     ax.set_global()
 
     # Extract coordinate columns - support common naming conventions
-    lat_col = None
-    lon_col = None
-
-    # Try to find latitude column
-    for col in df.columns:
-        col_lower = col.lower()
-        if col_lower in ["lat", "latitude", "y"]:
-            lat_col = col
-            break
-
-    # Try to find longitude column
-    for col in df.columns:
-        col_lower = col.lower()
-        if col_lower in ["lon", "lng", "long", "longitude", "x"]:
-            lon_col = col
-            break
+    lat_col = _find_column(df, LATITUDE_COLUMNS)
+    lon_col = _find_column(df, LONGITUDE_COLUMNS)
 
     if lat_col is None or lon_col is None:
         raise ValueError(
@@ -136,9 +147,14 @@ def _create_pie_plot(ax: plt.Axes, df: pd.DataFrame, **kwargs) -> None:
 
 
 def _create_plot(  # noqa: C901
-    df: pd.DataFrame, plot_type: str, **kwargs
-) -> tuple[plt.Figure, plt.Axes]:
-    """Create a plot using matplotlib/seaborn."""
+    df: pd.DataFrame, plot_type: str, fig: Figure | None = None, /, **kwargs
+) -> tuple[Figure, plt.Axes]:
+    """
+    Create a plot using matplotlib/seaborn.
+
+    Draws on `fig` when given, which must be empty, otherwise on a new pyplot figure. `fig`
+    is positional-only, so a plot parameter with the same name ends up in `kwargs`.
+    """
     if df.empty:
         raise ValueError("CSV data is empty")
 
@@ -152,12 +168,14 @@ def _create_plot(  # noqa: C901
             f"Unsupported plot type: {plot_type}. Supported types: {supported_plot_types}"
         )
 
-    # Create figure with appropriate projection for world map
-    if plot_type == "worldmap":
+    if fig is None:
         fig = plt.figure(figsize=PLOT_FIGURE_SIZE, dpi=PLOT_DPI)
+
+    # Create axes with appropriate projection for world map
+    if plot_type == "worldmap":
         ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
     else:
-        fig, ax = plt.subplots(figsize=PLOT_FIGURE_SIZE, dpi=PLOT_DPI)
+        ax = fig.add_subplot(1, 1, 1)
 
     # Extract optional parameters for figure title and axis labels
     # These are not accepted by Seaborn
@@ -192,14 +210,96 @@ def _create_plot(  # noqa: C901
     return fig, ax
 
 
-def plot_to_bytes(df: pd.DataFrame, plot_type: str, **kwargs) -> bytes:
-    """Generate a plot and return it as bytes."""
-    fig, _ = _create_plot(df, plot_type, **kwargs)
-    buffer = io.BytesIO()
-    fig.savefig(buffer, format="png", bbox_inches="tight")
-    plt.close(fig)
+def _reusable_figure() -> Figure:
+    """Return this thread's reusable figure, creating it on first use."""
+    fig = getattr(_thread_local, "fig", None)
+    if fig is None:
+        # Not registered with pyplot, so it is never shown and does not need closing
+        fig = Figure(figsize=PLOT_FIGURE_SIZE, dpi=PLOT_DPI)
+        FigureCanvasAgg(fig)
+        _thread_local.fig = fig
+    return fig
+
+
+def _reusable_buffer() -> io.BytesIO:
+    """Return this thread's reusable output buffer, rewound to the start."""
+    buffer = getattr(_thread_local, "buffer", None)
+    if buffer is not None:
+        try:
+            # Even an empty write fails while a view from plot_to_buffer is still alive
+            buffer.write(b"")
+        except BufferError:
+            buffer = None
+    if buffer is None:
+        buffer = io.BytesIO()
+        _thread_local.buffer = buffer
     buffer.seek(0)
-    return buffer.getvalue()
+    return buffer
+
+
+def plot_to_buffer(
+    df: pd.DataFrame,
+    plot_type: str,
+    plot_kwargs: dict | None = None,
+    image_format: str = PLOT_FORMAT,
+) -> memoryview:
+    """
+    Generate a plot and return a read-only view of the encoded image, without copying it.
+
+    `plot_kwargs` are the plotting parameters. They are kept apart from `image_format` so
+    that user-supplied parameters can never change the output format.
+
+    The view points into a buffer that later calls on the same thread reuse, so release it
+    (e.g. with a `with` block) once done. If it is still alive, the next call allocates a
+    new buffer instead.
+    """
+    if image_format not in IMAGE_FORMAT_PIL_KWARGS:
+        raise ValueError(
+            f"Unsupported image format: {image_format}. "
+            f"Supported formats: {list(IMAGE_FORMAT_PIL_KWARGS)}"
+        )
+
+    fig = _reusable_figure()
+    buffer = _reusable_buffer()
+    try:
+        _create_plot(df, plot_type, fig, **(plot_kwargs or {}))
+        fig.savefig(
+            buffer,
+            format=image_format,
+            bbox_inches="tight",
+            pil_kwargs=IMAGE_FORMAT_PIL_KWARGS[image_format],
+        )
+    finally:
+        # Drop the artists so the figure does not keep the plotted data alive between calls
+        fig.clear()
+        # tight_layout moved the subplot margins, reset them so every plot is laid out from
+        # the same starting point and renders the same as on a new figure
+        fig.subplotpars = SubplotParams()
+
+    # The buffer is not truncated so it keeps its capacity, which means a larger previous
+    # image may still follow the current position. Only expose what was just written.
+    with buffer.getbuffer() as view:
+        return view[: buffer.tell()].toreadonly()
+
+
+def plot_to_bytes(
+    df: pd.DataFrame, plot_type: str, image_format: str = PLOT_FORMAT, /, **kwargs
+) -> bytes:
+    """Generate a plot and return it as bytes encoded in the given image format."""
+    with plot_to_buffer(df, plot_type, kwargs, image_format) as view:
+        return view.tobytes()
+
+
+def warmup() -> None:
+    """
+    Render and encode a small plot with the Agg backend.
+
+    Loads the font cache, backend, seaborn and image encoder, and creates this thread's
+    reusable figure up front so that the first plot request does not pay for them.
+    """
+    matplotlib.use("Agg")
+    df = pd.DataFrame({"x": [0, 1], "y": [0, 1]})
+    plot_to_bytes(df, "line", x="x", y="y", title="warmup")
 
 
 def plot_and_show(df: pd.DataFrame, plot_type: str, **kwargs) -> None:
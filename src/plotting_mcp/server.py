@@ -1,23 +1,24 @@
 """MCP server for generating plots from CSV data."""
 
-import base64
-import io
-import json
+import sys
 from pathlib import Path
-from urllib.request import Request
 
 import click
-import pandas as pd
 import structlog
 import uvicorn
 from mcp.server.fastmcp import FastMCP
-from mcp.types import ImageContent, TextContent
+from mcp.types import ImageContent, ResourceLink, TextContent
+from starlette.requests import Request
 from starlette.responses import JSONResponse, Response
 
+from plotting_mcp._generate import (
+    generate_plot_impl,
+    generate_plots_impl,
+    get_served_plot,
+    start_renderer,
+)
 from plotting_mcp.configure_logging import configure_logging
-from plotting_mcp.constants import MCP_PORT
-from plotting_mcp.plot import plot_to_bytes
-from plotting_mcp.utils import sizeof_fmt
+from plotting_mcp.constants import MCP_PORT, PLOT_FORMAT
 
 logger = structlog.get_logger(__name__)
 
@@ -27,9 +28,9 @@ mcp = FastMCP(name="plotting-mcp")
 
 
 @mcp.tool()
-def generate_plot(
+async def generate_plot(
     csv_data: str, plot_type: str = "line", json_kwargs: str = "None"
-) -> tuple[TextContent, ImageContent]:
+) -> tuple[TextContent, ImageContent | ResourceLink]:
     """
     Generate a plot from CSV data.
 
@@ -41,6 +42,9 @@ def generate_plot(
             If not specified, the plot will be generated with default parameters.
             Additional plotting parameters in JSON format. For line/bar plots, Seaborn is used,
             so any parameters supported by Seaborn's plotting functions can be passed.
+            For all plots, you can specify:
+                - `max_rows` (int): maximum number of CSV rows to plot, extra rows are dropped
+                  (default: 500000)
             For bar/line plots, you can specify:
                 - `x` (str): Column name for x-axis
                 - `y` (str): Column name for y-axis
@@ -54,40 +58,33 @@ def generate_plot(
                 - `marker` (str): marker style (default: 'o')
 
     Returns:
-        tuple[TextContent, ImageContent]: A tuple containing a success message and the
-        generated plot as an image.
+        tuple[TextContent, ImageContent | ResourceLink]: A tuple containing a success message
+        and the generated plot, either as an image or as a link to download it.
     """
-    if json_kwargs != "None":
-        try:
-            kwargs = json.loads(json_kwargs)
-        except Exception:
-            logger.exception("Invalid JSON for kwargs")
-            raise
-    else:
-        kwargs = {}
+    return await generate_plot_impl(csv_data, plot_type, json_kwargs)
 
-    try:
-        df = pd.read_csv(io.StringIO(csv_data))
 
-        plot_bytes = plot_to_bytes(df, plot_type, **kwargs)
+@mcp.tool()
+async def generate_plots(
+    csv_data_list: list[str], plot_types: list[str], json_kwargs_list: list[str]
+) -> list[tuple[TextContent, ImageContent | ResourceLink]]:
+    """
+    Generate several plots from CSV data in a single call.
 
-        logger.info(
-            "Plot generated successfully",
-            plot_type=plot_type,
-            kwargs=kwargs,
-            size=sizeof_fmt(len(plot_bytes)),
-        )
-        return (
-            TextContent(type="text", text="Plot generated successfully"),
-            ImageContent(
-                type="image",
-                data=base64.b64encode(plot_bytes).decode(),
-                mimeType="image/png",
-            ),
-        )
-    except Exception:
-        logger.exception("Error generating plot")
-        raise
+    Args:
+        csv_data_list (list[str]): CSV data for each plot, as strings
+        plot_types (list[str]): Type of each plot (line, bar, pie, worldmap)
+        json_kwargs_list (list[str]): JSON string with additional parameters for each plot, or
+            "None" for default parameters. Accepts the same parameters as `generate_plot`.
+
+    The three lists must have the same length, the plot at each position is generated from the
+    entries at that position.
+
+    Returns:
+        list[tuple[TextContent, ImageContent | ResourceLink]]: One success message and generated
+        plot per requested plot, in the same order.
+    """
+    return await generate_plots_impl(csv_data_list, plot_types, json_kwargs_list)
 
 
 # Health check endpoint
@@ -96,6 +93,15 @@ def health_check(request: Request) -> Response:
     return JSONResponse({"status": "ok"})
 
 
+# Download endpoint for plots returned as links (when PLOT_BASE_URL is set)
+@mcp.custom_route("/plot/{plot_id}", methods=["GET"])
+async def get_plot(request: Request) -> Response:
+    plot_bytes = get_served_plot(request.path_params["plot_id"])
+    if plot_bytes is None:
+        return JSONResponse({"error": "Plot not found or expired"}, status_code=404)
+    return Response(content=plot_bytes, media_type=f"image/{PLOT_FORMAT}")
+
+
 # Have to do it this way to conform the string expected by uvicorn.run
 # Expected format: "<module>:<attribute>"
 starlette_app = mcp.streamable_http_app()
@@ -122,6 +128,11 @@ starlette_app = mcp.streamable_http_app()
 def main(log_level: str = "INFO", reload: bool = False, transport: str = "http") -> None:
     """Main entry point for the MCP server."""
     logging_dict = configure_logging(log_level=log_level)
+    # With --reload the app is imported again in a child process, so warming up here would be
+    # wasted. That development mode skips the warmup: the child starts its workers on the
+    # first request, or renders it cold when PLOT_WORKERS is 0.
+    if not reload:
+        start_renderer()
 
     if transport == "stdio":
         mcp.run("stdio")
@@ -138,6 +149,11 @@ def main(log_level: str = "INFO", reload: bool = False, transport: str = "http")
             reload=reload,
             reload_dirs=[str(Path(__file__).parent.absolute())],
             timeout_graceful_shutdown=2,
+            # Use the C event loop and HTTP parser shipped with uvicorn[standard] explicitly,
+            # so a missing one fails at startup instead of silently falling back to pure Python.
+            # uvloop is not available on Windows.
+            loop="asyncio" if sys.platform == "win32" else "uvloop",
+            http="httptools",
         )
     else:
         raise ValueError(f"Unsupported transport type: {transport}")
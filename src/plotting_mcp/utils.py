@@ -1,9 +1,152 @@
+import base64
+import hashlib
+import io
+import json
+
+import pandas as pd
+import structlog
+
+try:
+    import pyarrow as pa  # ty: ignore[unresolved-import]
+    from pyarrow import csv as pacsv  # ty: ignore[unresolved-import]
+except ImportError:  # pyarrow is an optional speedup, fall back to pandas' parser
+    pa = None  # ty: ignore[invalid-assignment]
+    pacsv = None  # ty: ignore[invalid-assignment]
+
+try:
+    import orjson  # ty: ignore[unresolved-import]
+except ImportError:  # orjson is an optional speedup, fall back to the stdlib parser
+    orjson = None  # ty: ignore[invalid-assignment]
+
+try:
+    import pybase64  # ty: ignore[unresolved-import]
+except ImportError:  # pybase64 is an optional speedup, fall back to the stdlib encoder
+    pybase64 = None  # ty: ignore[invalid-assignment]
+
+try:
+    import xxhash  # ty: ignore[unresolved-import]
+except ImportError:  # xxhash is an optional speedup, fall back to hashlib
+    xxhash = None  # ty: ignore[invalid-assignment]
+
+logger = structlog.get_logger(__name__)
+
+# Below this size pyarrow's setup overhead outweighs its faster parser
+PYARROW_MIN_CSV_SIZE = 64 * 1024
+
+
+_SIZE_UNITS = ("", "Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "Zi", "Yi")
+
+
 def sizeof_fmt(num, suffix="B"):
     """
     Convert a number to a human-readable format with appropriate suffix.
     """
-    for unit in ("", "Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "Zi"):
-        if abs(num) < 1024.0:
-            return f"{num:3.1f}{unit}{suffix}"
-        num /= 1024.0
-    return f"{num:.1f}Yi{suffix}"
+    # Every unit is 2**10 times the previous one, so the unit follows from the bit length
+    exponent = min(max(int(abs(num)).bit_length() - 1, 0) // 10, len(_SIZE_UNITS) - 1)
+    return f"{num / (1 << (10 * exponent)):3.1f}{_SIZE_UNITS[exponent]}{suffix}"
+
+
+def loads_json(data: str):
+    """
+    Parse a JSON document, using orjson when it is installed.
+
+    orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can catch the
+    latter regardless of which parser ran.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _read_csv_pandas(csv_data: str, nrows: int | None = None) -> pd.DataFrame:
+    """Parse CSV data with pandas' C engine, optionally stopping after `nrows` rows."""
+    # Hand the C tokenizer a contiguous byte buffer instead of wrapping the str in StringIO,
+    # and read the whole input in one pass so column types are inferred once
+    return pd.read_csv(
+        io.BytesIO(csv_data.encode("utf-8")),
+        engine="c",
+        low_memory=False,
+        cache_dates=True,
+        nrows=nrows,
+    )
+
+
+def _read_csv_pyarrow(csv_data: str) -> pd.DataFrame:
+    """Parse CSV data with pyarrow's multithreaded reader."""
+    encoded = csv_data.encode()
+    read_options = pacsv.ReadOptions(use_threads=True, block_size=1 << 20)
+    # pyarrow infers dates and times that pandas leaves as strings. Read those columns as
+    # strings so column types do not depend on the payload size. The streaming reader
+    # only parses the first block to infer the schema.
+    with pacsv.open_csv(pa.BufferReader(encoded), read_options=read_options) as reader:
+        temporal_columns = {
+            field.name: pa.string() for field in reader.schema if pa.types.is_temporal(field.type)
+        }
+    table = pacsv.read_csv(
+        pa.BufferReader(encoded),
+        read_options=read_options,
+        convert_options=pacsv.ConvertOptions(
+            column_types=temporal_columns,
+            # Match pandas, which reads empty string cells as NaN
+            strings_can_be_null=True,
+        ),
+    )
+    # Convert each column into its own block and release its Arrow memory right after,
+    # so the full table and the full DataFrame are never held at the same time.
+    # Columns are not kept Arrow-backed (types_mapper), since seaborn fails on those.
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def read_csv(csv_data: str, max_rows: int | None = None) -> pd.DataFrame:
+    """
+    Parse CSV data into a DataFrame.
+
+    Large payloads are parsed with pyarrow's multithreaded CSV reader when it is installed.
+    Small payloads, payloads pyarrow rejects, or every payload when pyarrow is missing, are
+    parsed by pandas. If `max_rows` is given, parsing stops once that many rows have been
+    read and the result is truncated to them.
+    """
+    # The newline count is a cheap upper bound on the number of rows, so only payloads
+    # that may exceed the budget pay for the row-limited parse
+    if max_rows is not None and csv_data.count("\n") > max_rows:
+        # Read one extra row to tell a truncated input apart from one that fits exactly
+        df = _read_csv_pandas(csv_data, nrows=max_rows + 1)
+        if len(df) > max_rows:
+            logger.warning("CSV data truncated", max_rows=max_rows)
+            df = df.iloc[:max_rows]
+        return df
+
+    if pa is not None and pacsv is not None and len(csv_data) >= PYARROW_MIN_CSV_SIZE:
+        try:
+            return _read_csv_pyarrow(csv_data)
+        except pa.ArrowInvalid:
+            # pyarrow is stricter than pandas, e.g. pandas reads rows with one more field than
+            # the header as an index column. Let pandas parse it so the result does not
+            # depend on the payload size.
+            logger.debug("pyarrow could not parse the CSV data, falling back to pandas")
+
+    return _read_csv_pandas(csv_data)
+
+
+def b64encode_str(data: bytes | memoryview) -> str:
+    """
+    Base64-encode bytes straight into a str.
+
+    Uses pybase64's SIMD encoder when it is installed, which also skips the intermediate
+    bytes object that the stdlib needs before decoding to str.
+    """
+    if pybase64 is not None:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode()
+
+
+def digest_str(data: str) -> bytes:
+    """
+    Compute a fast, non-cryptographic digest of a string, suitable as a cache key.
+
+    Uses xxhash's 128-bit XXH3 when it is installed, and BLAKE2b from hashlib otherwise.
+    """
+    encoded = data.encode()
+    if xxhash is not None:
+        return xxhash.xxh3_128_digest(encoded)
+    return hashlib.blake2b(encoded, digest_size=16).digest()
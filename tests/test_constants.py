@@ -0,0 +1,22 @@
+"""Tests for configuration constants."""
+
+import importlib
+
+import pytest
+
+from plotting_mcp import constants
+
+
+class TestPlotFormat:
+    """Test the PLOT_FORMAT setting."""
+
+    def test_unsupported_plot_format_fails_at_import(self, monkeypatch):
+        """Test that an unsupported PLOT_FORMAT is rejected when the module loads."""
+        monkeypatch.setenv("PLOT_FORMAT", "jpeg")
+
+        try:
+            with pytest.raises(ValueError, match="Unsupported PLOT_FORMAT: jpeg"):
+                importlib.reload(constants)
+        finally:
+            monkeypatch.delenv("PLOT_FORMAT")
+            importlib.reload(constants)
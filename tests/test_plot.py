@@ -1,15 +1,25 @@
 """Tests for plotting functionality."""
 
+import io
+
 import matplotlib.pyplot as plt
 import pandas as pd
 import pytest
 from matplotlib.figure import Figure
+from PIL import Image
 
+from plotting_mcp import plot
+from plotting_mcp.constants import PLOT_DPI, PLOT_HEIGHT, PLOT_WIDTH
 from plotting_mcp.plot import (
+    LATITUDE_COLUMNS,
+    LONGITUDE_COLUMNS,
     _auto_rotate_labels,
     _create_pie_plot,
     _create_plot,
+    _find_column,
+    plot_to_buffer,
     plot_to_bytes,
+    warmup,
 )
 
 
@@ -131,6 +141,29 @@ class TestCreatePiePlot:
         plt.close(fig)
 
 
+class TestFindColumn:
+    """Test the _find_column function."""
+
+    def test_find_column_is_case_insensitive(self):
+        """Test that coordinate columns are matched regardless of case."""
+        df = pd.DataFrame({"City": ["A"], "Latitude": [1.0], "LNG": [2.0]})
+
+        assert _find_column(df, LATITUDE_COLUMNS) == "Latitude"
+        assert _find_column(df, LONGITUDE_COLUMNS) == "LNG"
+
+    def test_find_column_returns_first_match(self):
+        """Test that the first matching column in DataFrame order is returned."""
+        df = pd.DataFrame({"y": [1.0], "lat": [2.0]})
+
+        assert _find_column(df, LATITUDE_COLUMNS) == "y"
+
+    def test_find_column_no_match(self):
+        """Test that None is returned when no column matches."""
+        df = pd.DataFrame({"a": [1.0], "b": [2.0]})
+
+        assert _find_column(df, LATITUDE_COLUMNS) is None
+
+
 class TestCreateMatplotlibPlot:
     """Test the _create_matplotlib_plot function."""
 
@@ -203,9 +236,37 @@ class TestPlotToBytes:
 
         assert isinstance(result, bytes)
         assert len(result) > 0
-        # Check PNG header
+        # Check WebP header
+        assert result.startswith(b"RIFF")
+        assert result[8:12] == b"WEBP"
+
+    def test_plot_to_bytes_png_format(self):
+        """Test that plot_to_bytes can still produce PNG images."""
+        df = pd.DataFrame({"x": [1, 2, 3, 4, 5], "y": [2, 4, 6, 8, 10]})
+
+        result = plot_to_bytes(df, "line", "png", x="x", y="y")
+
         assert result.startswith(b"\x89PNG")
 
+    def test_plot_to_bytes_image_size_follows_plot_dpi(self):
+        """Test that the image is rasterized at PLOT_DPI, within the figure size."""
+        df = pd.DataFrame({"x": [1, 2, 3, 4, 5], "y": [2, 4, 6, 8, 10]})
+
+        with Image.open(io.BytesIO(plot_to_bytes(df, "line", x="x", y="y"))) as image:
+            width, height = image.size
+
+        # bbox_inches="tight" trims the margins, so the image can only be smaller
+        assert width <= PLOT_WIDTH * PLOT_DPI
+        assert height <= PLOT_HEIGHT * PLOT_DPI
+        assert width > PLOT_WIDTH * PLOT_DPI * 0.8
+
+    def test_plot_to_bytes_unsupported_format(self):
+        """Test that an unsupported image format raises ValueError."""
+        df = pd.DataFrame({"x": [1, 2, 3], "y": [4, 5, 6]})
+
+        with pytest.raises(ValueError, match="Unsupported image format"):
+            plot_to_bytes(df, "line", "gif", x="x", y="y")
+
     def test_plot_to_bytes_different_plot_types(self):
         """Test plot_to_bytes with different plot types."""
         df_line = pd.DataFrame({"x": [1, 2, 3], "y": [4, 5, 6]})
@@ -218,4 +279,62 @@ class TestPlotToBytes:
 
         assert all(isinstance(b, bytes) for b in [line_bytes, bar_bytes, pie_bytes])
         assert all(len(b) > 0 for b in [line_bytes, bar_bytes, pie_bytes])
-        assert all(b.startswith(b"\x89PNG") for b in [line_bytes, bar_bytes, pie_bytes])
+        assert all(b.startswith(b"RIFF") for b in [line_bytes, bar_bytes, pie_bytes])
+
+    def test_plot_to_bytes_fig_kwarg_does_not_clash_with_reused_figure(self):
+        """Test that a "fig" plot parameter is passed to the plot like any other."""
+        df = pd.DataFrame({"x": [1, 2], "y": [1, 2]})
+
+        # Rejected by matplotlib as an unknown parameter, not as a duplicate argument
+        with pytest.raises(AttributeError, match="unexpected keyword argument 'fig'"):
+            plot_to_bytes(df, "line", x="x", y="y", fig="figure")
+
+    def test_plot_to_bytes_reused_buffer_has_no_stale_tail(self, monkeypatch):
+        """Test that a plot written over a larger leftover buffer is not padded with old bytes."""
+        df = pd.DataFrame({"x": [1, 2], "y": [1, 2]})
+        junk = b"\xff" * 10_000_000
+        monkeypatch.setattr(plot._thread_local, "buffer", io.BytesIO(junk), raising=False)
+
+        reused_bytes = plot_to_bytes(df, "line", x="x", y="y")
+        monkeypatch.setattr(plot._thread_local, "buffer", io.BytesIO())
+        fresh_bytes = plot_to_bytes(df, "line", x="x", y="y")
+
+        assert reused_bytes == fresh_bytes
+        # The RIFF header stores the size of the rest of the file
+        assert int.from_bytes(reused_bytes[4:8], "little") == len(reused_bytes) - 8
+
+
+class TestPlotToBuffer:
+    """Test the plot_to_buffer function."""
+
+    def test_plot_to_buffer_returns_read_only_view(self):
+        """Test that plot_to_buffer returns a read-only view of the encoded image."""
+        df = pd.DataFrame({"x": [1, 2, 3], "y": [4, 5, 6]})
+
+        with plot_to_buffer(df, "line", {"x": "x", "y": "y"}) as view:
+            assert isinstance(view, memoryview)
+            assert view.readonly
+            assert view[8:12].tobytes() == b"WEBP"
+
+    def test_plot_to_buffer_live_view_is_not_overwritten(self):
+        """Test that rendering again while a view is alive leaves that view intact."""
+        df = pd.DataFrame({"x": [1, 2, 3], "y": [4, 5, 6]})
+
+        with plot_to_buffer(df, "line", {"x": "x", "y": "y"}) as first:
+            first_bytes = first.tobytes()
+            second = plot_to_bytes(df, "bar", x="x", y="y")
+
+            assert first.tobytes() == first_bytes
+            assert second.startswith(b"RIFF")
+
+
+class TestWarmup:
+    """Test the warmup function."""
+
+    def test_warmup_leaves_no_open_figures(self):
+        """Test that warmup closes the figure it renders."""
+        open_figures = plt.get_fignums()
+
+        warmup()
+
+        assert plt.get_fignums() == open_figures
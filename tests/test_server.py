@@ -1,13 +1,31 @@
 """Tests for server functionality."""
 
+import asyncio
 import base64
+import datetime
 import json
 
 import pytest
-from mcp.types import ImageContent, TextContent
+from mcp.types import ImageContent, ResourceLink, TextContent
 from pandas.errors import EmptyDataError
+from starlette.testclient import TestClient
 
-from plotting_mcp.server import generate_plot
+from plotting_mcp import _generate
+from plotting_mcp._generate import get_served_plot, start_renderer
+from plotting_mcp.server import generate_plot, generate_plots, starlette_app
+from plotting_mcp.utils import PYARROW_MIN_CSV_SIZE
+
+
+@pytest.fixture(autouse=True)
+def clear_plot_caches():
+    """Keep cached and served plots from leaking between tests."""
+    _generate._plot_cache.clear()
+    _generate._served_plots.clear()
+    _generate._served_bytes = 0
+    yield
+    _generate._plot_cache.clear()
+    _generate._served_plots.clear()
+    _generate._served_bytes = 0
 
 
 class TestGeneratePlot:
@@ -17,7 +35,7 @@ class TestGeneratePlot:
         """Test basic line plot generation."""
         csv_data = "x,y\n1,2\n2,4\n3,6\n4,8\n5,10"
 
-        result = generate_plot(csv_data, "line", json_kwargs='{"x": "x", "y": "y"}')
+        result = asyncio.run(generate_plot(csv_data, "line", json_kwargs='{"x": "x", "y": "y"}'))
 
         assert isinstance(result, tuple)
         assert len(result) == 2
@@ -30,62 +48,114 @@ class TestGeneratePlot:
         assert text_content.text == "Plot generated successfully"
 
         assert image_content.type == "image"
-        assert image_content.mimeType == "image/png"
+        assert image_content.mimeType == "image/webp"
         assert len(image_content.data) > 0
 
         # Verify the image data is valid base64
         decoded_data = base64.b64decode(image_content.data)
-        assert decoded_data.startswith(b"\x89PNG")
+        assert decoded_data.startswith(b"RIFF")
+        assert decoded_data[8:12] == b"WEBP"
 
     def test_generate_plot_bar_chart(self):
         """Test bar chart generation."""
         csv_data = "category,values\nA,10\nB,15\nC,8\nD,12"
 
-        result = generate_plot(csv_data, "bar", json_kwargs='{"x": "category", "y": "values"}')
+        result = asyncio.run(
+            generate_plot(csv_data, "bar", json_kwargs='{"x": "category", "y": "values"}')
+        )
 
         text_content, image_content = result
         assert text_content.text == "Plot generated successfully"
-        assert image_content.mimeType == "image/png"
+        assert image_content.mimeType == "image/webp"
 
         # Verify the image data is valid
         decoded_data = base64.b64decode(image_content.data)
-        assert decoded_data.startswith(b"\x89PNG")
+        assert decoded_data.startswith(b"RIFF")
+        assert decoded_data[8:12] == b"WEBP"
 
     def test_generate_plot_pie_chart(self):
         """Test pie chart generation."""
         csv_data = "category,values\nA,30\nB,45\nC,25"
 
-        result = generate_plot(csv_data, "pie")
+        result = asyncio.run(generate_plot(csv_data, "pie"))
 
         text_content, image_content = result
         assert text_content.text == "Plot generated successfully"
-        assert image_content.mimeType == "image/png"
+        assert image_content.mimeType == "image/webp"
 
         # Verify the image data is valid
         decoded_data = base64.b64decode(image_content.data)
-        assert decoded_data.startswith(b"\x89PNG")
+        assert decoded_data.startswith(b"RIFF")
+        assert decoded_data[8:12] == b"WEBP"
 
     def test_generate_plot_default_parameters(self):
         """Test plot generation with default parameters."""
         csv_data = "x,y\n1,2\n2,4\n3,6"
 
         # Using defaults: plot_type="line", json_kwargs="None"
-        result = generate_plot(csv_data)
+        result = asyncio.run(generate_plot(csv_data))
 
         text_content, image_content = result
         assert text_content.text == "Plot generated successfully"
-        assert image_content.mimeType == "image/png"
+        assert image_content.mimeType == "image/webp"
 
     def test_generate_plot_with_title_and_labels(self):
         """Test plot generation with title and axis labels."""
         csv_data = "x,y\n1,2\n2,4\n3,6"
         kwargs = {"x": "x", "y": "y", "title": "Test Plot", "xlabel": "X Axis", "ylabel": "Y Axis"}
 
-        result = generate_plot(csv_data, "line", json.dumps(kwargs))
+        result = asyncio.run(generate_plot(csv_data, "line", json.dumps(kwargs)))
+
+        text_content, image_content = result
+        assert text_content.text == "Plot generated successfully"
+        assert image_content.mimeType == "image/webp"
+
+    def test_generate_plot_with_max_rows(self):
+        """Test plot generation with a row limit passed through the kwargs."""
+        csv_data = "x,y\n" + "".join(f"{i},{i * 2}\n" for i in range(100))
+        kwargs = {"x": "x", "y": "y", "max_rows": 10}
+
+        result = asyncio.run(generate_plot(csv_data, "line", json.dumps(kwargs)))
+
+        text_content, image_content = result
+        assert text_content.text == "Plot generated successfully"
+        assert image_content.mimeType == "image/webp"
+
+    @pytest.mark.parametrize("max_rows", ["10", -1, 0, 1.5, True, None])
+    def test_generate_plot_invalid_max_rows(self, max_rows):
+        """Test that max_rows must be a positive integer."""
+        csv_data = "x,y\n1,2\n2,4\n3,6"
+        kwargs = {"x": "x", "y": "y", "max_rows": max_rows}
+
+        with pytest.raises(ValueError, match="max_rows must be a positive integer"):
+            asyncio.run(generate_plot(csv_data, "line", json.dumps(kwargs)))
+
+    def test_generate_plot_large_payload_with_date_column(self):
+        """Test a line plot over a date column in a payload large enough for pyarrow."""
+        start = datetime.date(2000, 1, 1)
+        # A wide text column pushes the payload over the threshold with few points to draw
+        note = "n" * 1024
+        csv_data = "date,value,note\n" + "".join(
+            f"{start + datetime.timedelta(days=i)},{i},{note}\n" for i in range(64)
+        )
+        assert len(csv_data) >= PYARROW_MIN_CSV_SIZE
+
+        result = asyncio.run(
+            generate_plot(csv_data, "line", json_kwargs='{"x": "date", "y": "value"}')
+        )
 
         text_content, image_content = result
         assert text_content.text == "Plot generated successfully"
-        assert image_content.mimeType == "image/png"
+        assert base64.b64decode(image_content.data).startswith(b"RIFF")
+
+    def test_generate_plot_repeated_call_is_cached(self):
+        """Test that an identical call returns the cached plot."""
+        csv_data = "x,y\n1,3\n2,5\n3,7"
+
+        first = asyncio.run(generate_plot(csv_data, "line", '{"x": "x", "y": "y"}'))
+        second = asyncio.run(generate_plot(csv_data, "line", '{"x": "x", "y": "y"}'))
+
+        assert second[1] is first[1]
 
     def test_generate_plot_invalid_json_kwargs(self):
         """Test that invalid JSON kwargs raises exception."""
@@ -93,64 +163,199 @@ class TestGeneratePlot:
         invalid_json = '{"x": "x", "y": "y", invalid}'
 
         with pytest.raises(json.JSONDecodeError):
-            generate_plot(csv_data, "line", invalid_json)
+            asyncio.run(generate_plot(csv_data, "line", invalid_json))
+
+    @pytest.mark.parametrize("json_kwargs", ["[1, 2]", "null", '"x"', "3"])
+    def test_generate_plot_json_kwargs_not_an_object(self, json_kwargs):
+        """Test that json_kwargs must decode to a JSON object."""
+        csv_data = "x,y\n1,2\n2,4\n3,6"
+
+        with pytest.raises(ValueError, match="json_kwargs must be a JSON object"):
+            asyncio.run(generate_plot(csv_data, "line", json_kwargs))
+
+    def test_generate_plot_kwargs_cannot_change_image_format(self):
+        """Test that image_format in json_kwargs is passed to the plot, not the encoder."""
+        csv_data = "x,y\n1,2\n2,4\n3,6"
+        kwargs = {"x": "x", "y": "y", "image_format": "png"}
+
+        # Like any other unknown plot parameter, it is rejected by matplotlib
+        with pytest.raises(AttributeError, match="image_format"):
+            asyncio.run(generate_plot(csv_data, "line", json.dumps(kwargs)))
 
     def test_generate_plot_invalid_csv_data(self):
         """Test that invalid CSV data raises exception."""
         invalid_csv = "not,valid,csv\ndata"
 
         with pytest.raises(ValueError, match="CSV data contains NaN/null values"):
-            generate_plot(invalid_csv, "line", '{"x": "not", "y": "valid"}')
+            asyncio.run(generate_plot(invalid_csv, "line", '{"x": "not", "y": "valid"}'))
 
     def test_generate_plot_empty_csv_data(self):
         """Test that empty CSV data raises exception."""
         empty_csv = ""
 
         with pytest.raises(EmptyDataError, match="No columns to parse from file"):
-            generate_plot(empty_csv, "line")
+            asyncio.run(generate_plot(empty_csv, "line"))
 
     def test_generate_plot_unsupported_plot_type(self):
         """Test that unsupported plot type raises exception."""
         csv_data = "x,y\n1,2\n2,4\n3,6"
 
         with pytest.raises(ValueError, match="Unsupported plot type"):
-            generate_plot(csv_data, "unsupported_type")
+            asyncio.run(generate_plot(csv_data, "unsupported_type"))
 
     def test_generate_plot_worldmap_type(self):
         """Test worldmap plot generation."""
         csv_data = "lat,lon\n-33.941,18.467\n-33.942,18.468\n-33.941,18.467"
 
-        result = generate_plot(csv_data, "worldmap")
+        result = asyncio.run(generate_plot(csv_data, "worldmap"))
 
         text_content, image_content = result
         assert text_content.text == "Plot generated successfully"
-        assert image_content.mimeType == "image/png"
+        assert image_content.mimeType == "image/webp"
 
         # Verify the image data is valid
         decoded_data = base64.b64decode(image_content.data)
-        assert decoded_data.startswith(b"\x89PNG")
+        assert decoded_data.startswith(b"RIFF")
+        assert decoded_data[8:12] == b"WEBP"
 
     def test_generate_plot_with_seaborn_hue(self):
         """Test plot generation with seaborn hue parameter."""
         csv_data = "x,y,category\n1,2,A\n2,4,B\n3,6,A\n4,8,B\n5,10,A"
         kwargs = {"x": "x", "y": "y", "hue": "category"}
 
-        result = generate_plot(csv_data, "line", json.dumps(kwargs))
+        result = asyncio.run(generate_plot(csv_data, "line", json.dumps(kwargs)))
 
         text_content, image_content = result
         assert text_content.text == "Plot generated successfully"
-        assert image_content.mimeType == "image/png"
+        assert image_content.mimeType == "image/webp"
 
     def test_generate_plot_rejects_nan_values(self):
         """Test that CSV data with NaN values raises ValueError."""
         csv_data_with_nan = "x,y\n1,2\n2,\n3,6"  # Missing value in second row
 
         with pytest.raises(ValueError, match="CSV data contains NaN/null values"):
-            generate_plot(csv_data_with_nan, "line", '{"x": "x", "y": "y"}')
+            asyncio.run(generate_plot(csv_data_with_nan, "line", '{"x": "x", "y": "y"}'))
 
     def test_generate_plot_rejects_completely_empty_cells(self):
         """Test that CSV data with completely empty cells raises ValueError."""
         csv_data_with_empty = "x,y\n1,2\n,4\n3,6"  # Missing value in first column
 
         with pytest.raises(ValueError, match="CSV data contains NaN/null values"):
-            generate_plot(csv_data_with_empty, "line", '{"x": "x", "y": "y"}')
+            asyncio.run(generate_plot(csv_data_with_empty, "line", '{"x": "x", "y": "y"}'))
+
+
+class TestGeneratePlots:
+    """Test the generate_plots MCP tool."""
+
+    def test_generate_plots_returns_one_result_per_plot(self):
+        """Test that each requested plot is generated, in order."""
+        csv_data_list = ["x,y\n1,2\n2,4\n3,6", "category,values\nA,30\nB,45\nC,25"]
+
+        results = asyncio.run(
+            generate_plots(csv_data_list, ["line", "pie"], ['{"x": "x", "y": "y"}', "None"])
+        )
+
+        assert len(results) == 2
+        for text_content, image_content in results:
+            assert text_content.text == "Plot generated successfully"
+            assert image_content.mimeType == "image/webp"
+            assert base64.b64decode(image_content.data)[8:12] == b"WEBP"
+        assert results[0][1].data != results[1][1].data
+
+    def test_generate_plots_mismatched_lengths(self):
+        """Test that lists of different lengths raise ValueError."""
+        with pytest.raises(ValueError, match="must have the same length"):
+            asyncio.run(generate_plots(["x,y\n1,2"], ["line", "bar"], ["None"]))
+
+    def test_generate_plots_propagates_errors(self):
+        """Test that a failing plot makes the whole batch fail."""
+        csv_data_list = ["x,y\n1,2\n2,4", "x,y\n1,2\n2,4"]
+
+        with pytest.raises(ValueError, match="Unsupported plot type"):
+            asyncio.run(generate_plots(csv_data_list, ["line", "scatter3d"], ["None", "None"]))
+
+
+class TestGetPlot:
+    """Test the /plot/{plot_id} download endpoint."""
+
+    def test_generate_plot_returns_downloadable_link(self, monkeypatch):
+        """Test that plots are returned as links when PLOT_BASE_URL is set."""
+        monkeypatch.setattr("plotting_mcp._generate.PLOT_BASE_URL", "http://testserver")
+        csv_data = "x,y\n1,4\n2,8\n3,12"
+
+        result = asyncio.run(generate_plot(csv_data, "line", '{"x": "x", "y": "y"}'))
+
+        text_content, link = result
+        assert text_content.text == "Plot generated successfully"
+        assert isinstance(link, ResourceLink)
+        assert link.mimeType == "image/webp"
+
+        response = TestClient(starlette_app).get(str(link.uri))
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        assert response.content[8:12] == b"WEBP"
+
+    def test_served_plots_over_byte_cap_drop_the_oldest(self, monkeypatch):
+        """Test that the oldest plots are dropped once PLOT_URL_MAX_BYTES is exceeded."""
+        monkeypatch.setattr("plotting_mcp._generate.PLOT_URL_MAX_BYTES", 10)
+
+        for plot_id in ("a", "b", "c"):
+            _generate._serve_plot(plot_id, b"12345")
+
+        assert get_served_plot("a") is None
+        assert get_served_plot("b") == b"12345"
+        assert get_served_plot("c") == b"12345"
+
+    def test_served_plot_larger_than_cap_is_kept(self, monkeypatch):
+        """Test that the most recent plot stays downloadable even if it exceeds the cap."""
+        monkeypatch.setattr("plotting_mcp._generate.PLOT_URL_MAX_BYTES", 4)
+
+        _generate._serve_plot("a", b"12345")
+
+        assert get_served_plot("a") == b"12345"
+
+    def test_expired_plots_are_dropped_on_lookup(self, monkeypatch):
+        """Test that expired plots are freed by a lookup, not only by the next plot."""
+        monkeypatch.setattr("plotting_mcp._generate.PLOT_URL_TTL", 0)
+        _generate._serve_plot("a", b"12345")
+
+        assert get_served_plot("a") is None
+        assert not _generate._served_plots
+
+    def test_get_plot_unknown_id(self):
+        """Test that an unknown plot id returns 404."""
+        response = TestClient(starlette_app).get("/plot/unknown")
+
+        assert response.status_code == 404
+
+
+class TestStartRenderer:
+    """Test starting the rendering worker pool."""
+
+    def test_start_renderer_starts_the_pool(self, monkeypatch):
+        """Test that the workers are started up front and then render plots."""
+        monkeypatch.setattr("plotting_mcp._generate.PLOT_WORKERS", 1)
+        monkeypatch.setattr("plotting_mcp._generate._pool", None)
+
+        start_renderer()
+        pool = _generate._pool
+        try:
+            assert pool is not None
+            result = asyncio.run(generate_plot("x,y\n1,5\n2,7\n3,9", "line"))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        assert base64.b64decode(result[1].data)[8:12] == b"WEBP"
+
+    def test_start_renderer_without_workers(self, monkeypatch):
+        """Test that this process is warmed up instead of a pool when PLOT_WORKERS is 0."""
+        calls = []
+        monkeypatch.setattr("plotting_mcp._generate.PLOT_WORKERS", 0)
+        monkeypatch.setattr("plotting_mcp._generate._pool", None)
+        monkeypatch.setattr("plotting_mcp._generate.warmup", lambda: calls.append("warmup"))
+
+        start_renderer()
+
+        assert _generate._pool is None
+        assert calls == ["warmup"]
@@ -1,6 +1,20 @@
 """Tests for utility functions."""
 
-from plotting_mcp.utils import sizeof_fmt
+import base64
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from plotting_mcp.utils import (
+    PYARROW_MIN_CSV_SIZE,
+    b64encode_str,
+    digest_str,
+    loads_json,
+    read_csv,
+    sizeof_fmt,
+)
 
 
 class TestUtilsIntegration:
@@ -21,3 +35,120 @@ class TestUtilsIntegration:
 
         for size, expected in sizes.items():
             assert sizeof_fmt(size) == expected
+
+    def test_sizeof_fmt_unit_boundaries(self):
+        """Test sizeof_fmt around unit boundaries and at the extremes."""
+        sizes = {
+            0: "0.0B",
+            1023: "1023.0B",
+            1048575.5: "1024.0KiB",  # rounds up but still below 1 MiB
+            1024**8: "1.0YiB",
+            1024**9: "1024.0YiB",
+        }
+
+        for size, expected in sizes.items():
+            assert sizeof_fmt(size) == expected
+
+
+class TestReadCsv:
+    """Test the read_csv function."""
+
+    def test_read_csv_small_payload(self):
+        """Test that small payloads are parsed into a DataFrame."""
+        df = read_csv("x,y\n1,2\n3,4")
+
+        assert list(df.columns) == ["x", "y"]
+        assert df["y"].tolist() == [2, 4]
+
+    def test_read_csv_large_payload_with_pyarrow(self):
+        """Test that large payloads parsed by pyarrow match the pandas result."""
+        pytest.importorskip("pyarrow")
+        rows = PYARROW_MIN_CSV_SIZE // 8 + 1
+        csv_data = "x,y\n" + "".join(f"{i},{i * 2}\n" for i in range(rows))
+
+        df = read_csv(csv_data)
+
+        assert len(df) == rows
+        pd.testing.assert_frame_equal(df, pd.read_csv(io.StringIO(csv_data)))
+
+    def test_read_csv_large_payload_rows_longer_than_header(self):
+        """Test that rows with an extra field parse like pandas does, as an index column."""
+        rows = PYARROW_MIN_CSV_SIZE // 8 + 1
+        csv_data = "x,y\n" + "".join(f"{i},{i},{i * 2}\n" for i in range(rows))
+
+        df = read_csv(csv_data)
+
+        pd.testing.assert_frame_equal(df, pd.read_csv(io.StringIO(csv_data)))
+
+    def test_read_csv_large_payload_empty_strings_are_null(self):
+        """Test that empty string cells are read as nulls regardless of the parser."""
+        rows = PYARROW_MIN_CSV_SIZE // 8 + 1
+        csv_data = "name,value\n" + "".join(f"a{i},{i}\n" for i in range(rows)) + ",1\n"
+
+        df = read_csv(csv_data)
+
+        assert pd.isnull(df["name"].iloc[-1])
+
+    def test_read_csv_large_payload_dates_stay_strings(self):
+        """Test that date and time cells are read as strings regardless of the parser."""
+        rows = PYARROW_MIN_CSV_SIZE // 8 + 1
+        csv_data = "date,time,value\n" + "".join(
+            f"2024-01-{i % 28 + 1:02d},10:{i % 60:02d},{i}\n" for i in range(rows)
+        )
+
+        large = read_csv(csv_data)
+        small = read_csv(csv_data[:200])
+
+        assert large["date"].iloc[0] == small["date"].iloc[0] == "2024-01-01"
+        assert large["time"].iloc[1] == small["time"].iloc[1] == "10:01"
+
+    def test_read_csv_truncates_to_max_rows(self):
+        """Test that rows beyond max_rows are dropped."""
+        csv_data = "x,y\n" + "".join(f"{i},{i}\n" for i in range(10))
+
+        df = read_csv(csv_data, max_rows=4)
+
+        assert df["x"].tolist() == [0, 1, 2, 3]
+
+    def test_read_csv_max_rows_exact_fit(self):
+        """Test that an input with exactly max_rows rows is kept whole."""
+        csv_data = "x,y\n" + "".join(f"{i},{i}\n" for i in range(4))
+
+        df = read_csv(csv_data, max_rows=4)
+
+        assert len(df) == 4
+
+
+class TestB64EncodeStr:
+    """Test the b64encode_str function."""
+
+    def test_b64encode_str_matches_stdlib(self):
+        """Test that the encoded string matches the stdlib encoder."""
+        data = bytes(range(256)) * 3
+
+        result = b64encode_str(data)
+
+        assert isinstance(result, str)
+        assert result == base64.b64encode(data).decode()
+
+
+class TestLoadsJson:
+    """Test the loads_json function."""
+
+    def test_loads_json_parses_object(self):
+        """Test that a JSON object is parsed into a dict."""
+        assert loads_json('{"x": "a", "s": 10}') == {"x": "a", "s": 10}
+
+    def test_loads_json_invalid_raises_json_decode_error(self):
+        """Test that invalid JSON raises the stdlib JSONDecodeError."""
+        with pytest.raises(json.JSONDecodeError):
+            loads_json('{"x": "a", invalid}')
+
+
+class TestDigestStr:
+    """Test the digest_str function."""
+
+    def test_digest_str_is_deterministic(self):
+        """Test that equal strings produce equal digests and different ones do not."""
+        assert digest_str("x,y\n1,2") == digest_str("x,y\n1,2")
+        assert digest_str("x,y\n1,2") != digest_str("x,y\n1,3")